@@ -2,7 +2,7 @@
 import argparse
 import json
 
-from . import cam
+from . import cam, metrics
 
 
 def read_config(path):
@@ -15,13 +15,24 @@ def read_config(path):
 parser = argparse.ArgumentParser(description="Control a camera")
 parser.add_argument("--config", help="Path to configuration file.")
 parser.add_argument("--output", default=False, action="store_true")
+parser.add_argument(
+    "--verbose",
+    default=False,
+    action="store_true",
+    help="Log the move vector on every tick.",
+)
+parser.add_argument(
+    "--record",
+    metavar="PATH",
+    help="Record input events and camera commands to PATH for replay.",
+)
 parser.add_argument(
     "camname",
     help="The camera name (should correspond with an entry in the config file)",
 )
 parser.add_argument(
     "control",
-    choices=["joystick", "tracker", "network"],
+    choices=["joystick", "tracker", "network", "tour", "handoff"],
     help="Which control mode you want to use",
 )
 args = parser.parse_args()
@@ -29,9 +40,19 @@ args = parser.parse_args()
 config = read_config(args.config)
 
 config["output"] = args.output
+config["verbose"] = args.verbose
+config["record"] = args.record
 config["cam"] = config[args.camname]  # general name e.g. to get stream info
+config["camname"] = args.camname
+
+if "metrics" in config:
+    metrics.serve(
+        int(config["metrics"].get("port", 9100)),
+        config["metrics"].get("host", "127.0.0.1"),
+    )
 
-camera = cam.Camera(config[args.camname])
+# handoff workers open their own camera sessions
+camera = None if args.control.lower() == "handoff" else cam.Camera(config[args.camname])
 
 if args.control.lower() == "joystick":
     from . import joystick
@@ -45,8 +66,25 @@ elif args.control.lower() == "network":
     from . import mqtt
 
     ControlCls = mqtt.NetworkController
+elif args.control.lower() == "tour":
+    from . import tour
+
+    ControlCls = tour.TourController
+elif args.control.lower() == "handoff":
+    from . import handoff
+
+    ControlCls = handoff.HandoffCoordinator
 else:
     raise ValueError(f"Invalid control arg {args.control}")
 
 control = ControlCls(camera, config)
-control.loop()
+
+if config.get("events"):
+    from . import events
+
+    events.start_events(config, camera, control)
+
+try:
+    control.loop()
+finally:
+    control.close()
@@ -3,24 +3,82 @@ The code to control a camera from a joystick.
 """
 
 import math
+import time
 import logging
+from datetime import timedelta
 
 from onvif import ONVIFCamera
 from onvif.exceptions import ONVIFError
 
 import zeep
+from zeep.transports import Transport
+
+from . import metrics, supervise
 
 LOG = logging.getLogger(__name__)
 
+PULLPOINT_NS = "http://www.onvif.org/ver10/events/wsdl/PullPointSubscription"
+
+# seconds to wait for a camera to answer before giving up on a request
+DEFAULT_REQUEST_TIMEOUT_S = 5.0
+
+# requests' connection and timeout errors are OSErrors
+CAMERA_ERRORS = (ONVIFError, zeep.exceptions.Error, OSError)
+
 
 def zeep_pythonvalue(self, xmlvalue):
     return xmlvalue
 
 
+def is_fault(err):
+    """Return True if the camera answered with a SOAP fault, i.e. it's alive."""
+    # onvif-zeep re-raises everything as ONVIFError inside its except block
+    return isinstance(err, zeep.exceptions.Fault) or isinstance(
+        err.__context__, zeep.exceptions.Fault
+    )
+
+
+class ZoomSpeedModel:
+    """
+    Scale pan/tilt velocities so on-screen angular speed is constant across zoom.
+
+    The field of view narrows roughly in proportion to the magnification, so a
+    fixed pan speed sweeps the picture much faster at full zoom. Each camera can
+    provide a calibration table of ``[zoom, factor]`` pairs (zoom normalized to
+    0..1) under ``zoom_speed`` in its config; otherwise the factor falls back to
+    ``1 / magnification`` using the camera's ``optical_zoom`` (default 1, i.e.
+    no scaling).
+    """
+
+    def __init__(self, config):
+        self._table = sorted(
+            (float(zoom), float(factor))
+            for zoom, factor in config.get("zoom_speed", [])
+        )
+        self._optical_zoom = float(config.get("optical_zoom", 1.0))
+
+    @property
+    def is_identity(self):
+        """True if the factor is always 1, so the zoom position doesn't matter."""
+        return not self._table and self._optical_zoom == 1.0
+
+    def factor(self, zoom):
+        """Return the velocity scaling factor at a normalized zoom position."""
+        zoom = min(max(zoom, 0.0), 1.0)
+        if not self._table:
+            return 1.0 / (1.0 + zoom * (self._optical_zoom - 1.0))
+        if zoom <= self._table[0][0]:
+            return self._table[0][1]
+        for (z1, f1), (z2, f2) in zip(self._table, self._table[1:]):
+            if zoom <= z2:
+                return f1 + (f2 - f1) * (zoom - z1) / (z2 - z1)
+        return self._table[-1][1]
+
+
 class Camera:
     """The camera"""
 
-    def __init__(self, config):
+    def __init__(self, config, clock=time.monotonic):
         self._request = None
         self._ptz = None
         self._token = None
@@ -33,29 +91,101 @@ class Camera:
         self.YMIN = -1
         self._active_vector = [0.0, 0.0, 0.0]
         self._active_focus = 0.0
-        self.init_camera(config)
+        self._speed_model = ZoomSpeedModel(config)
+        # full zoom range travelled per second at zoom velocity 1.0
+        self._zoom_rate = float(config.get("zoom_rate", 0.25))
+        self._zoom_poll_interval = float(config.get("zoom_poll_interval", 5.0))
+        self._zoom_min = 0.0
+        self._zoom_max = 1.0
+        self._zoom = 0.0
+        # zoom is estimated against this clock so a replay can drive it
+        self._clock = clock
+        self._zoom_time = clock()
+        self._zoom_polled = clock()
+        self._presets = None
+        self._pullpoint = None
+        self._pullpoint_expires = 0.0
+        self._subscription_s = float(config.get("event_subscription_s", 600))
+        # event failures back off on their own so they never trip the breaker
+        # that guards PTZ control
+        self._events_backoff = supervise.Backoff(
+            float(config.get("reconnect_min", 1.0)),
+            float(config.get("reconnect_max", 60.0)),
+        )
+        self._events_retry_at = 0.0
+        self.recorder = None
+        self.name = config["host"]
+        backoff = supervise.Backoff(
+            float(config.get("reconnect_min", 1.0)),
+            float(config.get("reconnect_max", 60.0)),
+        )
+        self._session = supervise.Supervisor(
+            self.name,
+            lambda: self.init_camera(config),
+            errors=CAMERA_ERRORS,
+            is_fault=is_fault,
+            breaker=supervise.CircuitBreaker(
+                int(config.get("failure_threshold", 3)), backoff
+            ),
+        )
+        self._session.ensure()
+
+    def _call(self, service, operation, request):
+        """
+        Send a request over the supervised ONVIF session.
+
+        Returns ``supervise.FAILED`` without raising if the camera is
+        unreachable so that a rebooting camera doesn't take the controller
+        down with it.
+        """
+        return self._session.call(
+            lambda: self._send(operation, getattr(self, service), request)
+        )
+
+    def _send(self, operation, service, request=None):
+        """Send a request, recording count, errors and latency."""
+        metrics.CAMERA_REQUESTS.inc(camera=self.name, operation=operation)
+        if self.recorder is not None:
+            self.recorder.record_command(operation)
+        args = () if request is None else (request,)
+        try:
+            with metrics.CAMERA_LATENCY.time(camera=self.name, operation=operation):
+                return getattr(service, operation)(*args)
+        except Exception:
+            metrics.CAMERA_ERRORS.inc(camera=self.name, operation=operation)
+            raise
 
     def init_camera(self, config):
         """Set up the camera."""
 
+        # without a timeout a camera that stops answering blocks the caller
+        # until the OS gives up on the connection
+        timeout = float(config.get("request_timeout", DEFAULT_REQUEST_TIMEOUT_S))
         mycam = ONVIFCamera(
             config["host"],
             config.get("port", 80),
             config.get("username"),
             config.get("password"),
+            transport=Transport(timeout=timeout, operation_timeout=timeout),
         )
         self.cam = mycam
+        # any event subscription belonged to the previous session
+        self._pullpoint = None
+        self._pullpoint_expires = 0.0
+        self._events_retry_at = 0.0
+        # presets may have changed while the camera was away
+        self._presets = None
         media = mycam.create_media_service()
         ptz = mycam.create_ptz_service()
         self._ptz = ptz
 
         zeep.xsd.simple.AnySimpleType.pythonvalue = zeep_pythonvalue
-        media_profile = media.GetProfiles()[0]
+        media_profile = self._send("GetProfiles", media)[0]
 
         # Get PTZ configuration options for getting continuous move range
         request = ptz.create_type("GetConfigurationOptions")
         request.ConfigurationToken = media_profile.PTZConfiguration.token
-        ptz_configuration_options = ptz.GetConfigurationOptions(request)
+        ptz_configuration_options = self._send("GetConfigurationOptions", ptz, request)
 
         image = mycam.create_imaging_service()
         request = image.create_type("GetImagingSettings")
@@ -63,9 +193,9 @@ class Camera:
         self._imaging_token = media_profile.VideoSourceConfiguration.SourceToken
         # this info is kind of FYI during debugging/dev
         # current settings
-        imaging_settings = image.GetImagingSettings(request)
+        imaging_settings = self._send("GetImagingSettings", image, request)
         # valid options
-        imaging_options = image.GetOptions(request)
+        imaging_options = self._send("GetOptions", image, request)
         self._imaging = image
 
         # import ipdb
@@ -77,27 +207,87 @@ class Camera:
         self.XMIN = ranges.XRange.Min
         self.YMAX = ranges.YRange.Max
         self.YMIN = ranges.YRange.Min
+        try:
+            zoom_range = ptz_configuration_options.Spaces.AbsoluteZoomPositionSpace[0]
+            self._zoom_min = zoom_range.XRange.Min
+            self._zoom_max = zoom_range.XRange.Max
+        except (AttributeError, IndexError, TypeError):
+            # not all cameras advertise absolute zoom; assume generic 0..1
+            pass
 
         request = ptz.create_type("ContinuousMove")
         request.ProfileToken = media_profile.token
         token = {"ProfileToken": media_profile.token}
         self._token = media_profile.token
-        ptz.Stop(token)
+        self._send("Stop", ptz, token)
         if request.Velocity is None:
-            request.Velocity = ptz.GetStatus(token).Position
+            request.Velocity = self._send("GetStatus", ptz, token).Position
             if not request.Velocity.PanTilt:
                 # call GetStatus again to get a new copy
-                request.Velocity.PanTilt = ptz.GetStatus(token).Position.Zoom
+                status = self._send("GetStatus", ptz, token)
+                request.Velocity.PanTilt = status.Position.Zoom
                 request.Velocity.PanTilt.y = 0
             request.Velocity.PanTilt.space = ranges.URI
             request.Velocity.Zoom.space = (
                 ptz_configuration_options.Spaces.ContinuousZoomVelocitySpace[0].URI
             )
         self._request = request
+        if not self._speed_model.is_identity:
+            self.refresh_zoom()
         # import ipdb
         # ipdb.set_trace()
 
+    def refresh_zoom(self):
+        """Read the current zoom position from the camera status."""
+        self._zoom_time = self._zoom_polled = self._clock()
+        try:
+            status = self._send("GetStatus", self._ptz, {"ProfileToken": self._token})
+            zoom = status.Position.Zoom.x
+        except (AttributeError, TypeError):
+            LOG.debug("Camera does not report zoom position")
+            return
+        except ONVIFError as err:
+            if not is_fault(err):
+                raise
+            LOG.debug("Camera does not report zoom position")
+            return
+        span = (self._zoom_max - self._zoom_min) or 1.0
+        self._zoom = min(max((zoom - self._zoom_min) / span, 0.0), 1.0)
+
+    def _estimate_zoom(self):
+        """
+        Return the normalized zoom position.
+
+        Integrates the active zoom velocity since the last estimate so we
+        don't have to query the camera on every move.
+        """
+        now = self._clock()
+        elapsed = now - self._zoom_time
+        self._zoom_time = now
+        self._zoom += self._active_vector[2] * self._zoom_rate * elapsed
+        self._zoom = min(max(self._zoom, 0.0), 1.0)
+        return self._zoom
+
+    def _poll_zoom(self):
+        """
+        Re-read the zoom position if a poll is due.
+
+        Called after a move has been sent so the extra round trip never delays
+        the command itself.
+        """
+        if self._speed_model.is_identity:
+            return
+        now = self._clock()
+        # None means the zoom jumped (e.g. to a preset) and must be re-read
+        if self._zoom_polled is None or (
+            self._zoom_poll_interval
+            and now - self._zoom_polled > self._zoom_poll_interval
+        ):
+            self._zoom_polled = now
+            self._session.call(self.refresh_zoom)
+
     def perform_move(self, vector):
+        """Start moving at ``vector``. Return True if the request went through."""
         # if vector isn't that different from the last vector,
         # just leave the existing one to minimize jerkiness
         # of sending too many requests
@@ -108,20 +298,34 @@ class Camera:
         #    # close enough. don't update anything
         #    return
 
+        if not self._session.ensure():
+            return False
+
+        # integrate zoom up to now using the previous vector
+        factor = self._speed_model.factor(self._estimate_zoom())
         self._active_vector = vector
         x, y, zoom = vector  # assume unit vector
 
-        self._request.Velocity.PanTilt.x = x * self.XMAX
-        self._request.Velocity.PanTilt.y = y * self.YMAX
+        self._request.Velocity.PanTilt.x = x * self.XMAX * factor
+        self._request.Velocity.PanTilt.y = y * self.YMAX * factor
         self._request.Velocity.Zoom.x = zoom
-        self._ptz.ContinuousMove(self._request)
+        resp = self._call("_ptz", "ContinuousMove", self._request)
+        self._poll_zoom()
+        return resp is not supervise.FAILED
 
     def stop(self):
+        """Stop moving. Return True if a Stop request went through."""
 
         # Check the vector before stopping to prevent sending stop command at each frame
-        if any(self._active_vector):
-            self._active_vector = [0.0, 0.0, 0.0]
-            self._ptz.Stop({"ProfileToken": self._request.ProfileToken})
+        if not any(self._active_vector):
+            return False
+        self._estimate_zoom()
+        resp = self._call("_ptz", "Stop", {"ProfileToken": self._token})
+        if resp is supervise.FAILED:
+            # leave it marked as moving so the next tick tries again
+            return False
+        self._active_vector = [0.0, 0.0, 0.0]
+        return True
 
     def wiper_on(self):
         """Send an auxiliary command for tt:Wiper|On
@@ -134,20 +338,119 @@ class Camera:
         self._send_aux_cmd("tt:Wiper|Off")
 
     def _send_aux_cmd(self, cmd):
+        if not self._session.ensure():
+            return
         request = self._ptz.create_type("SendAuxiliaryCommand")
         request.ProfileToken = self._token
         request.AuxiliaryData = cmd
-        resp = self._ptz.SendAuxiliaryCommand(request)
+        resp = self._call("_ptz", "SendAuxiliaryCommand", request)
+
+    def _subscribe_events(self):
+        """
+        Create a PullPoint subscription and a service to pull from it.
+
+        Returns False, and backs off before trying again, if the camera can't
+        or won't give us a subscription.
+        """
+        try:
+            events = self.cam.create_events_service()
+            subscription = self._send(
+                "CreatePullPointSubscription",
+                events,
+                {"InitialTerminationTime": timedelta(seconds=self._subscription_s)},
+            )
+            # point the pullpoint service at this subscription rather than the
+            # one onvif-zeep made when connecting, which may have expired by now
+            address = subscription.SubscriptionReference.Address._value_1
+            self.cam.xaddrs[PULLPOINT_NS] = address
+            self._pullpoint = self.cam.create_pullpoint_service()
+        except CAMERA_ERRORS + (AttributeError, KeyError) as err:
+            self._events_failed(f"Could not subscribe to events on {self.name}", err)
+            return False
+        self._events_backoff.reset()
+        # resubscribe a bit before the camera drops us
+        self._pullpoint_expires = time.monotonic() + 0.8 * self._subscription_s
+        return True
+
+    def _events_failed(self, msg, err):
+        self._pullpoint = None
+        delay = self._events_backoff.next()
+        self._events_retry_at = time.monotonic() + delay
+        LOG.warning("%s (%s); retrying in %.1f s", msg, err, delay)
+
+    def pull_events(self, timeout=1.0, limit=100):
+        """
+        Return pending ONVIF notification messages.
+
+        Subscribes on first use and whenever the subscription is about to
+        expire or the camera has reconnected. Waits up to ``timeout`` seconds
+        for messages to arrive.
+        """
+        if not self._session.ensure() or time.monotonic() < self._events_retry_at:
+            return []
+        if self._pullpoint is None or time.monotonic() > self._pullpoint_expires:
+            if not self._subscribe_events():
+                return []
+        request = self._pullpoint.create_type("PullMessages")
+        request.Timeout = timedelta(seconds=timeout)
+        request.MessageLimit = limit
+        try:
+            response = self._send("PullMessages", self._pullpoint, request)
+        except CAMERA_ERRORS as err:
+            self._events_failed(f"Event subscription on {self.name} ended", err)
+            return []
+        return getattr(response, "NotificationMessage", None) or []
+
+    def get_presets(self):
+        """
+        Return the preset tokens defined on the camera.
+
+        The list is read with GetPresets once and cached, since presets rarely
+        change and tours look them up constantly.
+        """
+        if self._presets is None:
+            try:
+                presets = self._call("_ptz", "GetPresets", {"ProfileToken": self._token})
+            except ONVIFError as err:
+                LOG.warning("Could not read presets: %s", err)
+                return []
+            if presets is supervise.FAILED:
+                # camera unreachable; try again once it's back
+                return []
+            self._presets = [str(preset.token) for preset in presets or []]
+        return self._presets
 
     def goto_preset(self, number):
-        LOG.info("Going to preset %s", str(number))
+        token = str(number)
+        if self._presets is not None and token not in self._presets:
+            LOG.warning("Invalid preset %s", token)
+            return
+        if not self._session.ensure():
+            return
+        LOG.info("Going to preset %s", token)
         request = self._ptz.create_type("GotoPreset")
         request.ProfileToken = self._token
-        request.PresetToken = str(number)
+        request.PresetToken = token
         try:
-            resp = self._ptz.GotoPreset(request)
+            resp = self._call("_ptz", "GotoPreset", request)
         except ONVIFError:
-            print("Invalid preset {number}")
+            LOG.warning("Invalid preset %s", token)
+        # zoom jumps to the preset's position; re-read it on the next move
+        self._zoom_polled = None
+
+    def absolute_move(self, pan, tilt, zoom=None):
+        """Move to an absolute position in the camera's default spaces."""
+        if not self._session.ensure():
+            return
+        LOG.info("Moving to %s, %s (zoom %s)", pan, tilt, zoom)
+        request = self._ptz.create_type("AbsoluteMove")
+        request.ProfileToken = self._token
+        request.Position = {"PanTilt": {"x": pan, "y": tilt}}
+        if zoom is not None:
+            request.Position["Zoom"] = {"x": zoom}
+        self._call("_ptz", "AbsoluteMove", request)
+        # the zoom position may have changed; re-read it on the next move
+        self._zoom_polled = None
 
     def ir_on(self):
         LOG.info("IR ON")
@@ -162,18 +465,21 @@ class Camera:
         self.set_imaging_setting("IrCutFilter", "AUTO")
 
     def set_imaging_setting(self, setting, val):
+        if not self._session.ensure():
+            return
         request = self._imaging.create_type("SetImagingSettings")
         request.VideoSourceToken = self._imaging_token
         request.ImagingSettings = {setting: val}
-        resp = self._imaging.SetImagingSettings(request)
+        resp = self._call("_imaging", "SetImagingSettings", request)
 
     def set_focus_change(self, val):
         """skycam accepts speeds between -1 and 1."""
         dist = abs(val - self._active_focus)
-        if dist < 0.05:
+        if dist < 0.05 or not self._session.ensure():
             return
-        self._active_focus = val
         request = self._imaging.create_type("Move")
         request.VideoSourceToken = self._imaging_token
         request.Focus = {"Continuous": {"Speed": val}}
-        resp = self._imaging.Move(request)
+        resp = self._call("_imaging", "Move", request)
+        if resp is not supervise.FAILED:
+            self._active_focus = val
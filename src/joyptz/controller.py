@@ -1,5 +1,25 @@
 import math
+import time
+import queue
 import logging
+import functools
+
+from . import metrics, recording
+
+LOG = logging.getLogger(__name__)
+
+
+def _captures_commands(method):
+    """Attribute camera requests made by ``method`` to the recording."""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.recorder is None:
+            return method(self, *args, **kwargs)
+        with self.recorder.capture():
+            return method(self, *args, **kwargs)
+
+    return wrapper
 
 
 class Controller:
@@ -18,18 +38,117 @@ class Controller:
         self._focus = 0.0
         self._speed = 1.0
         self.log = log or logging.getLogger()
+        # per-tick logging is expensive on the hot path; opt in with verbose
+        self.verbose = config.get("verbose", False)
+        self._input_time = None
+        # work handed over from other threads, run by the controller's loop
+        self._soon = queue.Queue()
+        self.recorder = None
+        if config.get("record"):
+            self.recorder = recording.Recorder(config["record"])
+            if cam is not None:
+                cam.recorder = self.recorder
+            cam_config = config.get("cam", {})
+            self._record(
+                "start",
+                controller=self.__class__.__name__,
+                camera={
+                    key: cam_config[key]
+                    for key in recording.CAMERA_KEYS
+                    if key in cam_config
+                },
+            )
+
+    def close(self):
+        """Finish the recording, if there is one."""
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def queue_action(self, cmd):
+        """
+        Run an action from the controller's own loop.
+
+        Use this from other threads (e.g. camera events) so actions never run
+        concurrently with the loop's own camera requests or drawing.
+        """
+        self._call_soon(self.perform_action, cmd)
+
+    def _call_soon(self, func, *args):
+        self._soon.put((func, args))
+
+    def _run_soon(self, timeout=None):
+        """
+        Run work queued from other threads.
+
+        With a ``timeout``, wait up to that long for something to arrive.
+        """
+        block = timeout is not None
+        while True:
+            try:
+                func, args = self._soon.get(block, timeout)
+            except queue.Empty:
+                return
+            block = False
+            try:
+                func(*args)
+            except Exception:  # pylint: disable=broad-except
+                LOG.exception("Queued %s%s failed", func.__name__, args)
+
+    def _record(self, kind, **data):
+        """Add an event to the recording, if there is one."""
+        if self.recorder is not None:
+            self.recorder.record(kind, **data)
+
+    def _mark_input(self):
+        """Note when the input driving the next command was read."""
+        self._input_time = time.perf_counter()
+
+    @_captures_commands
+    def perform_action(self, cmd):
+        """
+        Run a one-off text command.
+
+        Supported: ``preset N``, ``move PAN TILT [ZOOM]`` (absolute),
+        ``wiper on``, ``wiper off``, ``ir on``, ``ir off`` and ``ir auto``.
+        """
+        self._record("action", cmd=cmd)
+        words = cmd.split()
+        if len(words) == 2 and words[0] == "preset":
+            self.cam.goto_preset(words[1])
+        elif len(words) in (3, 4) and words[0] == "move":
+            self.cam.absolute_move(*[float(v) for v in words[1:]])
+        elif cmd in ("wiper on", "wiper off", "ir on", "ir off", "ir auto"):
+            getattr(self.cam, cmd.replace(" ", "_"))()
+        else:
+            self.log.info(f"Unknown action {cmd}")
 
+    @_captures_commands
     def _process_move_vector(self):
+        self._record(
+            "tick",
+            vector=list(self._move_vector),
+            focus=self._focus,
+            locked=self.locked,
+        )
         mag = math.sqrt(sum([v**2 for v in self._move_vector]))
-        self.log.info(str(self._move_vector))
-        self.log.info(str(mag))
+        if self.verbose:
+            self.log.info(str(self._move_vector))
+            self.log.info(str(mag))
         # mag usually chilling at 0.005
         if not self.locked:
             if mag < 0.006:
-                self.log.info("stopped")
-                self.cam.stop()
+                if self.verbose:
+                    self.log.info("stopped")
+                sent = self.cam.stop()
             else:
-                self.cam.perform_move(self._move_vector)
+                sent = self.cam.perform_move(self._move_vector)
+            # only count ticks that actually sent the camera something
+            if sent and self._input_time is not None:
+                metrics.INPUT_LATENCY.observe(
+                    time.perf_counter() - self._input_time,
+                    controller=self.__class__.__name__,
+                )
+            self._input_time = None
 
         if abs(self._focus) > 0.006:
             self.cam.set_focus_change(self._focus)
@@ -0,0 +1,162 @@
+"""
+React to ONVIF events from the cameras.
+
+Cameras can report motion and analytics events through the ONVIF event
+service. The :class:`EventManager` pulls them from every subscribed camera on
+one shared thread and runs controller actions when they match a rule, e.g.
+waking the tracker on motion or going to a preset, so nothing needs to poll
+or run a tracker on an idle scene.
+
+Rules are configured under ``events``::
+
+    "events": {
+        "timeout": 1,
+        "rules": [
+            {"camera": "cam1", "topic": "CellMotionDetector/Motion",
+             "when": {"IsMotion": "true"}, "action": "track"},
+            {"camera": "cam1", "topic": "CellMotionDetector/Motion",
+             "when": {"IsMotion": "false"}, "action": "idle"}
+        ]
+    }
+"""
+import collections
+import logging
+import threading
+import time
+
+from .cam import Camera
+from .controller import Controller
+
+LOG = logging.getLogger(__name__)
+
+Event = collections.namedtuple("Event", ["camera", "topic", "items"])
+
+
+def parse_message(camera, message):
+    """Turn an ONVIF NotificationMessage into an :class:`Event`, or None."""
+    items = {}
+    try:
+        topic = message.Topic._value_1
+        # Source and Data are lists of SimpleItem Name/Value pairs
+        for item in message.Message._value_1.iter():
+            if isinstance(item.tag, str) and item.tag.endswith("SimpleItem"):
+                items[item.get("Name")] = item.get("Value")
+    except AttributeError:
+        LOG.debug("Ignoring malformed event from %s: %s", camera.name, message)
+        return None
+    return Event(camera, str(topic), items)
+
+
+class Rule:
+    """Run an action when an event matches a topic and item values."""
+
+    def __init__(self, topic, action, when=None, roi=None):
+        self.topic = topic
+        self.action = action
+        self.when = {name: str(value).lower() for name, value in (when or {}).items()}
+        if roi:
+            self.action = f"{action} " + " ".join(str(int(v)) for v in roi)
+
+    def matches(self, event):
+        if self.topic not in event.topic:
+            return False
+        return all(
+            str(event.items.get(name, "")).lower() == value
+            for name, value in self.when.items()
+        )
+
+
+class EventManager:
+    """Pull events from many cameras on a single thread."""
+
+    def __init__(self, timeout=1.0):
+        self.timeout = timeout
+        self._subscriptions = []
+        self._running = False
+        self._thread = None
+
+    def add(self, camera, rules, handler):
+        """
+        Subscribe to a camera's events.
+
+        ``handler`` is called with the action of each matching rule, typically
+        a controller's ``perform_action``.
+        """
+        self._subscriptions.append((camera, rules, handler))
+
+    def start(self):
+        """Start pulling events in the background."""
+        self._running = True
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+
+    def run(self):
+        """Pull from each camera in turn and dispatch matching actions."""
+        # split the long-poll wait across cameras so each is visited often
+        timeout = self.timeout / max(1, len(self._subscriptions))
+        while self._running:
+            start = time.monotonic()
+            for camera, rules, handler in self._subscriptions:
+                try:
+                    self._pull(camera, rules, handler, timeout)
+                except Exception:  # pylint: disable=broad-except
+                    # keep serving the other cameras
+                    LOG.exception("Failed to handle events from %s", camera.name)
+            # don't spin when every camera is down or returns immediately
+            elapsed = time.monotonic() - start
+            if elapsed < self.timeout:
+                time.sleep(self.timeout - elapsed)
+
+    def _pull(self, camera, rules, handler, timeout):
+        for message in camera.pull_events(timeout):
+            event = parse_message(camera, message)
+            if event is not None:
+                self.dispatch(event, rules, handler)
+
+    def dispatch(self, event, rules, handler):
+        LOG.debug("%s event %s %s", event.camera.name, event.topic, event.items)
+        for rule in rules:
+            if rule.matches(event):
+                LOG.info("%s: %s -> %s", event.camera.name, event.topic, rule.action)
+                try:
+                    handler(rule.action)
+                except Exception:  # pylint: disable=broad-except
+                    LOG.exception("Event action %s failed", rule.action)
+
+
+def start_events(config, camera, control):
+    """
+    Subscribe to the events configured for each camera and start pulling.
+
+    Rules for the controlled camera are queued for ``control``'s loop; rules
+    for other cameras, or all cameras if ``camera`` is None, get a plain
+    :class:`Controller` (presets, IR, wiper) that nothing else drives, so
+    they run right on the event thread.
+    """
+    conf = config.get("events", {})
+    by_camera = collections.defaultdict(list)
+    for rule_conf in conf.get("rules", []):
+        camname = rule_conf.get("camera", config.get("camname"))
+        by_camera[camname].append(
+            Rule(
+                rule_conf["topic"],
+                rule_conf["action"],
+                rule_conf.get("when"),
+                rule_conf.get("roi"),
+            )
+        )
+
+    manager = EventManager(float(conf.get("timeout", 1.0)))
+    for camname, rules in by_camera.items():
+        if camera is not None and camname == config.get("camname"):
+            manager.add(camera, rules, control.queue_action)
+        else:
+            other = Controller(Camera(config[camname]), dict(config, record=None))
+            manager.add(other.cam, rules, other.perform_action)
+    manager.start()
+    return manager
@@ -0,0 +1,309 @@
+"""
+Hand a tracked target from one camera to the next.
+
+Each camera runs its own tracker pipeline in a worker process. Workers report
+where the target is in their frame, and the coordinator watches the active
+camera: as the target nears an edge that has a neighboring camera, the
+neighbor is pre-positioned (preset or absolute move), and once the target
+leaves the frame the neighbor starts tracking it and the old camera goes idle.
+
+Configured under ``handoff``::
+
+    "handoff": {
+        "cameras": ["cam1", "cam2"],
+        "start": "cam1",
+        "edge_frac": 0.15,
+        "grace_s": 3,
+        "neighbors": {
+            "cam1": {"right": {"camera": "cam2", "preset": 2,
+                               "roi": [20, 300, 80, 60]}},
+            "cam2": {"left": {"camera": "cam1", "move": [0.9, 0.1, 0.2]}}
+        }
+    }
+
+``roi`` is where the target should appear in the neighbor's frame once it is
+in position; without it the box is mirrored onto the neighbor's opposite edge.
+The edge a target was handed over through is ignored until the target clears
+it or ``grace_s`` passes, so it isn't handed straight back.
+
+A worker that dies is restarted after a backoff (``reconnect_min`` and
+``reconnect_max`` from its camera's config); if it was the active camera it
+picks up tracking where it last saw the target.
+"""
+import logging
+import multiprocessing
+import queue
+import time
+
+from . import metrics, supervise
+from .cam import Camera
+from .controller import Controller
+from .tracking import TrackedController
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_EDGE_FRAC = 0.15
+DEFAULT_GRACE_S = 3.0
+# how far inside the frame a mirrored entry box is placed
+ENTRY_INSET_FRAC = 0.05
+OPPOSITE = {"left": "right", "right": "left", "top": "bottom", "bottom": "top"}
+# how often workers report the target position while it's tracked
+REPORT_INTERVAL_S = 0.2
+# how long to wait for a report before checking the workers are alive
+WORKER_CHECK_S = 1.0
+
+
+class PipelineController(TrackedController):
+    """A tracker that reports to and takes actions from the coordinator."""
+
+    def __init__(self, cam, config, reports, commands):
+        self._reports = reports
+        self._commands = commands
+        self._last_report = 0.0
+        self._last_ok = None
+        super().__init__(cam, config)
+
+    def _on_frame(self, frame):
+        while True:
+            try:
+                cmd = self._commands.get_nowait()
+            except queue.Empty:
+                return
+            self.perform_action(cmd)
+
+    def _on_track(self, ok, bbox, frame):
+        now = time.monotonic()
+        ok = bool(ok)
+        # report losing or regaining the target right away
+        if ok == self._last_ok and now - self._last_report < REPORT_INTERVAL_S:
+            return
+        self._last_report = now
+        self._last_ok = ok
+        height, width = frame.shape[:2]
+        self._reports.put(
+            (self.config["camname"], ok, [float(v) for v in bbox], (width, height))
+        )
+
+
+def run_pipeline(camname, config, reports, commands):
+    """Worker process entry point: track with one camera until terminated."""
+    logging.basicConfig(level=logging.INFO)
+    pipeline_config = dict(
+        config,
+        cam=dict(config[camname], start_idle=True),
+        camname=camname,
+        output=False,
+        record=None,
+        display=config["handoff"].get("display", False),
+    )
+    if "metrics" in config:
+        # each worker has its own metrics; serve them next to the coordinator's
+        index = config["handoff"]["cameras"].index(camname)
+        metrics.serve(
+            int(config["metrics"].get("port", 9100)) + 1 + index,
+            config["metrics"].get("host", "127.0.0.1"),
+        )
+    camera = Camera(config[camname])
+    PipelineController(camera, pipeline_config, reports, commands).loop()
+
+
+def edge_of(bbox, size, edge_frac):
+    """Return the frame edge the box center is near, or None."""
+    x, y, w, h = bbox
+    width, height = size
+    cx = (x + w / 2) / width
+    cy = (y + h / 2) / height
+    if cx < edge_frac:
+        return "left"
+    if cx > 1 - edge_frac:
+        return "right"
+    if cy < edge_frac:
+        return "top"
+    if cy > 1 - edge_frac:
+        return "bottom"
+    return None
+
+
+def touches(bbox, size, edge):
+    """Return True if the box has reached the given frame edge."""
+    x, y, w, h = bbox
+    width, height = size
+    return {
+        "left": x <= 0,
+        "right": x + w >= width,
+        "top": y <= 0,
+        "bottom": y + h >= height,
+    }[edge]
+
+
+def entry_roi(bbox, size, edge, inset=ENTRY_INSET_FRAC):
+    """Mirror a box leaving through ``edge`` just inside the opposite edge."""
+    x, y, w, h = bbox
+    width, height = size
+    if edge == "right":
+        x = inset * width
+    elif edge == "left":
+        x = width - w - inset * width
+    elif edge == "bottom":
+        y = inset * height
+    elif edge == "top":
+        y = height - h - inset * height
+    return [int(max(0, v)) for v in (x, y, w, h)]
+
+
+class HandoffCoordinator(Controller):
+    """Run tracker pipelines for several cameras and hand off between them."""
+
+    def __init__(self, cam, config, log=None):
+        super().__init__(cam, config, log)
+        conf = config["handoff"]
+        self.neighbors = conf.get("neighbors", {})
+        self.edge_frac = float(conf.get("edge_frac", DEFAULT_EDGE_FRAC))
+        self.grace_s = float(conf.get("grace_s", DEFAULT_GRACE_S))
+        self.active = conf.get("start", config.get("camname"))
+        self._check_config(conf["cameras"])
+        self._prepared = None  # edge whose neighbor has been pre-positioned
+        self._last = None  # last (bbox, size) seen on the active camera
+        # edge the target was handed over through, and when
+        self._entered = None
+        self._entered_at = 0.0
+
+        # spawn so workers don't inherit our threads and ONVIF sessions
+        self._context = multiprocessing.get_context("spawn")
+        self._reports = self._context.Queue()
+        self._commands = {}
+        self._workers = {}
+        self._backoffs = {}
+        self._restart_at = {}
+        for camname in conf["cameras"]:
+            self._backoffs[camname] = supervise.Backoff(
+                float(config[camname].get("reconnect_min", 1.0)),
+                float(config[camname].get("reconnect_max", 60.0)),
+            )
+            self._start_worker(camname)
+
+        self._track(self.active, config[self.active].get("roi"))
+
+    def _check_config(self, cameras):
+        """Raise ValueError unless every camera handed to has a pipeline."""
+        if self.active not in cameras:
+            raise ValueError(f"Handoff start camera {self.active} is not in cameras")
+        for camname, links in self.neighbors.items():
+            if camname not in cameras:
+                raise ValueError(f"Handoff neighbors for {camname}, not in cameras")
+            for edge, link in links.items():
+                if edge not in OPPOSITE:
+                    raise ValueError(f"Invalid handoff edge {edge} for {camname}")
+                if link.get("camera") not in cameras:
+                    raise ValueError(
+                        f"Handoff neighbor {link.get('camera')} of {camname} "
+                        "is not in cameras"
+                    )
+
+    def _start_worker(self, camname):
+        # a fresh queue, in case the old worker died holding the old one's lock
+        self._commands[camname] = self._context.Queue()
+        worker = self._context.Process(
+            target=run_pipeline,
+            args=(camname, self.config, self._reports, self._commands[camname]),
+            name=f"track-{camname}",
+            daemon=True,
+        )
+        worker.start()
+        self._workers[camname] = worker
+
+    def _check_workers(self):
+        """Restart any pipeline that has died, once its backoff has passed."""
+        now = time.monotonic()
+        for camname, worker in self._workers.items():
+            if worker.is_alive():
+                continue
+            if camname not in self._restart_at:
+                delay = self._backoffs[camname].next()
+                self._restart_at[camname] = now + delay
+                LOG.warning(
+                    "Pipeline for %s exited (code %s); restarting in %.1f s",
+                    camname,
+                    worker.exitcode,
+                    delay,
+                )
+            if now < self._restart_at[camname]:
+                continue
+            del self._restart_at[camname]
+            LOG.info("Restarting pipeline for %s", camname)
+            self._start_worker(camname)
+            if camname == self.active:
+                # pick up the target where the old pipeline last saw it
+                roi = self._last[0] if self._last else self.config[camname].get("roi")
+                self._track(camname, roi)
+
+    def _track(self, camname, roi=None):
+        self.send(camname, "track" + "".join(f" {int(v)}" for v in roi or []))
+
+    def send(self, camname, cmd):
+        """Queue an action for a camera's pipeline."""
+        LOG.info("%s: %s", camname, cmd)
+        self._commands[camname].put(cmd)
+
+    def loop(self):
+        while True:
+            try:
+                camname, ok, bbox, size = self._reports.get(timeout=WORKER_CHECK_S)
+            except queue.Empty:
+                self._check_workers()
+                continue
+            # reporting means the pipeline came up fine
+            self._backoffs[camname].reset()
+            if camname == self.active:
+                self.update(ok, bbox, size)
+            self._check_workers()
+
+    def update(self, ok, bbox, size):
+        """React to a tracker report from the active camera."""
+        if ok:
+            self._last = (bbox, size)
+            edge = edge_of(bbox, size, self.edge_frac)
+            if self._entered is not None and (
+                edge is None or time.monotonic() - self._entered_at > self.grace_s
+            ):
+                self._entered = None
+            if edge == self._entered:
+                # still coming in through the edge it was handed over on
+                edge = None
+            if edge is None:
+                self._prepared = None
+            elif edge != self._prepared and edge in self.neighbors.get(self.active, {}):
+                self._prepare(edge)
+            if self._prepared and touches(bbox, size, self._prepared):
+                self._handoff()
+        elif self._prepared:
+            # lost it right by the edge we were expecting it to cross
+            self._handoff()
+
+    def _prepare(self, edge):
+        """Pre-position the neighbor on ``edge`` of the active camera."""
+        link = self.neighbors[self.active][edge]
+        if "preset" in link:
+            self.send(link["camera"], f"preset {link['preset']}")
+        elif "move" in link:
+            self.send(link["camera"], "move " + " ".join(str(v) for v in link["move"]))
+        self._prepared = edge
+
+    def _handoff(self):
+        link = self.neighbors[self.active][self._prepared]
+        roi = link.get("roi")
+        if roi is None and self._last is not None:
+            roi = entry_roi(*self._last, self._prepared)
+        LOG.info("Handing off from %s to %s", self.active, link["camera"])
+        self.send(self.active, "idle")
+        self._track(link["camera"], roi)
+        self.active = link["camera"]
+        self._entered = OPPOSITE[self._prepared]
+        self._entered_at = time.monotonic()
+        self._prepared = None
+        self._last = None
+
+    def stop(self):
+        """Stop all pipelines."""
+        for worker in self._workers.values():
+            worker.terminate()
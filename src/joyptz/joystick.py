@@ -61,10 +61,10 @@ class JoystickController(Controller):
         pygame.joystick.init()
         log = TextPrint(screen)
         super().__init__(cam, config, log)
+        self._preset = 1
 
     def loop(self):
         done = False
-        preset = 1
         clock = pygame.time.Clock()
         while not done:
             self.log.reset()
@@ -73,6 +73,7 @@ class JoystickController(Controller):
                     done = True
                 self._handle_joystick_event(event)
                 self._handle_keyboard_event(event)
+            self._run_soon()
 
             self._read_joystick_axes()
             self._process_move_vector()
@@ -86,6 +87,7 @@ class JoystickController(Controller):
 
     def _read_joystick_axes(self):
         """Read joystick axes"""
+        self._mark_input()
         joystick_count = pygame.joystick.get_count()
         self.log.indent()
         axes_vals = []
@@ -146,6 +148,7 @@ class JoystickController(Controller):
 
             self.log.unindent()
         if axes_vals:
+            self._record("axes", values=axes_vals)
             # now move the camera accordingly!
             # just take the first three axes as x,y, and zoom
 
@@ -173,6 +176,8 @@ class JoystickController(Controller):
 
     def _handle_keyboard_event(self, event):
         if event.type == pygame.KEYDOWN:
+            self._mark_input()
+            self._record("key", key=event.key, down=True)
             vector = self._move_vector
             if event.key == pygame.K_RIGHT:
                 vector[0] = self._speed
@@ -195,6 +200,7 @@ class JoystickController(Controller):
                 pass
             self.log.info(f"{event.key} {event.unicode}")
         if event.type == pygame.KEYUP and event.key in MOVE_KEYS:
+            self._record("key", key=event.key, down=False)
             self.log.info("Stopping!")
             self._move_vector = [0, 0, 0]
 
@@ -202,26 +208,28 @@ class JoystickController(Controller):
         if event.type == pygame.JOYBUTTONDOWN:
             pass
         elif event.type == pygame.JOYBUTTONUP:
+            self._record("button", button=event.button)
             if event.button == 0:
                 self.locked = not self.locked
             elif event.button == 5:
-                self.cam.wiper_on()
+                self.perform_action("wiper on")
             elif event.button == 3:
                 self.ir_mode += 1
                 if self.ir_mode == 3:
                     self.ir_mode = 0
 
                 if self.ir_mode == 0:
-                    self.cam.ir_auto()
+                    self.perform_action("ir auto")
                 elif self.ir_mode == 1:
-                    self.cam.ir_on()
+                    self.perform_action("ir on")
                 elif self.ir_mode == 2:
-                    self.cam.ir_off()
+                    self.perform_action("ir off")
         elif event.type == pygame.JOYHATMOTION:
             hat = event.value
+            self._record("hat", value=list(hat))
             if hat[0] == 1:
-                preset += 1
-                self.cam.goto_preset(preset)
+                self._preset += 1
+                self.perform_action(f"preset {self._preset}")
             elif hat[0] == -1:
-                preset -= 1
-                self.cam.goto_preset(preset)
+                self._preset -= 1
+                self.perform_action(f"preset {self._preset}")
@@ -0,0 +1,228 @@
+"""
+Runtime metrics.
+
+Counters, gauges and latency histograms, served in the Prometheus text
+format from a small local HTTP server at ``/metrics``.
+"""
+import bisect
+import contextlib
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LOG = logging.getLogger(__name__)
+
+# seconds; SOAP round trips on a LAN are typically tens of milliseconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class _Metric:
+    """Shared bookkeeping for labelled metrics."""
+
+    kind = None
+
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self):
+        """Return the metric in Prometheus text format."""
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}"]
+
+
+class Counter(_Metric):
+    """A value that only goes up."""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """A value that can go up and down."""
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (e.g. latencies) in fixed buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name, description, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observe the time spent in a ``with`` block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_value(self, key, value):
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            labels = _format_labels(self.labelnames, key, [("le", le)])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {total}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """A collection of metrics to expose together."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+CAMERA_REQUESTS = REGISTRY.register(
+    Counter(
+        "joyptz_camera_requests_total",
+        "ONVIF requests sent to a camera.",
+        ("camera", "operation"),
+    )
+)
+CAMERA_ERRORS = REGISTRY.register(
+    Counter(
+        "joyptz_camera_request_errors_total",
+        "ONVIF requests that raised an error.",
+        ("camera", "operation"),
+    )
+)
+CAMERA_LATENCY = REGISTRY.register(
+    Histogram(
+        "joyptz_camera_request_seconds",
+        "ONVIF request round-trip time.",
+        ("camera", "operation"),
+    )
+)
+CONNECTION_UP = REGISTRY.register(
+    Gauge(
+        "joyptz_connection_up",
+        "1 if a supervised connection is up, else 0.",
+        ("name",),
+    )
+)
+RECONNECTS = REGISTRY.register(
+    Counter(
+        "joyptz_connection_attempts_total",
+        "Attempts to (re)connect a supervised connection.",
+        ("name",),
+    )
+)
+TRACKER_LATENCY = REGISTRY.register(
+    Histogram(
+        "joyptz_tracker_update_seconds",
+        "Time spent updating the image tracker per frame.",
+    )
+)
+INPUT_LATENCY = REGISTRY.register(
+    Histogram(
+        "joyptz_input_to_command_seconds",
+        "Time from reading controller input to sending the camera command.",
+        ("controller",),
+    )
+)
+MQTT_MESSAGES = REGISTRY.register(
+    Counter(
+        "joyptz_mqtt_messages_total",
+        "MQTT messages handled.",
+        ("topic",),
+    )
+)
+MQTT_LATENCY = REGISTRY.register(
+    Histogram(
+        "joyptz_mqtt_message_seconds",
+        "Time spent handling an MQTT message.",
+    )
+)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        LOG.debug(format, *args)
+
+
+def serve(port=9100, host="127.0.0.1"):
+    """Serve ``/metrics`` from a background thread and return the server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    LOG.info("Serving metrics at http://%s:%d/metrics", host, server.server_port)
+    return server
@@ -5,11 +5,11 @@ In order to control the camera from other systems (e.g homeassistant,
 the internet, etc.) we need a messaging protocol. MQTT is
 perfect for this.
 """
-import time
 
 import paho.mqtt.client as mqtt
 
 
+from . import metrics
 from .controller import Controller
 
 
@@ -20,27 +20,51 @@ class NetworkController(Controller):
         """Construct the MQTT client."""
         super().__init__(cam, config, log)
         self._client = None
+        self._name = None
         self.start()
 
     def on_connect(self, client, userdata, flags, rc):
         """Do callback for when MQTT server connects."""
         self.log.info("Connected with result code %d", rc)
+        if rc != 0:
+            return
+        metrics.CONNECTION_UP.set(1, name=self._name)
         client.subscribe(
             self.config["mqtt"]["topic"]
         )  # subscribe in case we get disconnected
 
+    def on_disconnect(self, client, userdata, rc):
+        """Do callback for when MQTT server disconnects."""
+        metrics.CONNECTION_UP.set(0, name=self._name)
+        if rc != 0:
+            self.log.warning("Lost MQTT connection (%d); reconnecting", rc)
+
     def on_message(self, client, userdata, msg):  # pylint: disable=unused-argument
         """Do callback for when MQTT receives a message."""
+        # handled on the main loop along with event actions, so only one
+        # thread ever drives the camera
+        self._call_soon(self._on_message, msg)
+
+    def _on_message(self, msg):
+        # label with the subscription rather than the message topic, which
+        # can be anything under a wildcard
+        metrics.MQTT_MESSAGES.inc(topic=self.config["mqtt"]["topic"])
+        with metrics.MQTT_LATENCY.time():
+            self._handle_message(msg)
+
+    def _handle_message(self, msg):
+        self._mark_input()
         self.log.info("%s %s", msg.topic, str(msg.payload))
         key = msg.topic.split("/")[-1]
         cmd = msg.payload.decode()
+        self._record("mqtt", topic=msg.topic, payload=cmd)
         if cmd == "ptz left":
             self._move_vector = [-1, 0, 0]
         elif cmd == "ptz stop":
             self._move_vector = [0, 0, 0]
         elif cmd.startswith("preset"):
             ps = int(cmd.split()[1])
-            self.cam.goto_preset(ps)
+            self.perform_action(f"preset {ps}")
 
         if "ptz" in cmd:
             self._process_move_vector()
@@ -49,23 +73,33 @@ class NetworkController(Controller):
         """Connect to the MQTT server."""
         conf = self.config["mqtt"]
         self.log.info("Connecting to MQTT server at %s", conf["broker"])
+        # exported alongside the supervised camera and stream connections
+        self._name = f"mqtt {conf['broker']}"
+        metrics.CONNECTION_UP.set(0, name=self._name)
         self._client = mqtt.Client(
             conf["client_id"], protocol=int(conf.get("protocol", 4))
         )
         self._client.on_connect = self.on_connect
         self._client.on_message = self.on_message
+        self._client.on_disconnect = self.on_disconnect
+        # the network loop reconnects on its own with exponential backoff
+        self._client.reconnect_delay_set(
+            int(conf.get("reconnect_min", 1)), int(conf.get("reconnect_max", 60))
+        )
         if conf.get("username"):
             self._client.username_pw_set(conf["username"], conf["password"])
         if conf.get("certificate"):
             self._client.tls_set(conf["certificate"])
-        self._client.connect(
+        # connect from the network loop so an unreachable broker is retried
+        # rather than raised
+        self._client.connect_async(
             conf["broker"], conf["port"], int(conf.get("keepalive", 60))
         )
 
     def loop(self):
         self._client.loop_start()
         while True:
-            time.sleep(0.5)
+            self._run_soon(0.5)
 
     def stop(self):
         """End the MQTT connection."""
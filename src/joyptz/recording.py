@@ -0,0 +1,75 @@
+"""
+Recording of controller input and camera commands.
+
+A recording is a JSON-lines file. Each line is an event with the seconds
+since recording began (``t``), a ``kind`` and kind-specific fields:
+
+* ``start``: the controller class and camera settings
+* raw inputs: ``axes``, ``button``, ``key``, ``mqtt``, ``bbox``
+* ``tick``: the state handed to ``Controller._process_move_vector``
+* ``action``: a text command run through ``Controller.perform_action``
+* ``command``: an ONVIF request the camera sent for a tick or action
+"""
+import contextlib
+import json
+import threading
+import time
+
+# camera settings that are safe and useful to store with a recording
+CAMERA_KEYS = (
+    "optical_zoom",
+    "zoom_speed",
+    "zoom_rate",
+    "zoom_poll_interval",
+    "failure_threshold",
+)
+
+
+class Recorder:
+    """Append time-stamped events to a recording file."""
+
+    def __init__(self, path):
+        # line buffered so a killed process still leaves a usable recording
+        self._file = open(path, "w", encoding="utf-8", buffering=1)
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def record(self, kind, **data):
+        event = {"t": round(time.monotonic() - self._start, 6), "kind": kind}
+        event.update(data)
+        line = json.dumps(event)
+        with self._lock:
+            # background threads may still be reporting after close
+            if not self._file.closed:
+                self._file.write(line + "\n")
+
+    @contextlib.contextmanager
+    def capture(self):
+        """Record camera commands sent from this thread within the block."""
+        previous = getattr(self._local, "capturing", False)
+        self._local.capturing = True
+        try:
+            yield
+        finally:
+            self._local.capturing = previous
+
+    def record_command(self, operation):
+        """
+        Record a camera request if it was made for a tick or action.
+
+        Background requests such as event pulls can't be reproduced by a
+        replay, so they are left out.
+        """
+        if getattr(self._local, "capturing", False):
+            self.record("command", operation=operation)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def read_recording(path):
+    """Return the events in a recording file."""
+    with open(path, "r", encoding="utf-8") as recording:
+        return [json.loads(line) for line in recording if line.strip()]
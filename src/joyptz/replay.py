@@ -0,0 +1,197 @@
+"""
+Replay a recording against a mock camera.
+
+Feeds the recorded events back through a controller as fast as possible,
+so changes to the control logic can be checked for how many camera commands
+they send and how long each step takes to process. Recordings of the MQTT
+controller are replayed from the raw messages, so command parsing is
+exercised too; other controllers are replayed from their ticks and actions.
+The camera's clock follows the recorded timestamps, so replays are
+repeatable::
+
+    $ python -m joyptz --config credentials.json --record run.jsonl cam1 joystick
+    $ python -m joyptz.replay run.jsonl
+"""
+import argparse
+import collections
+import statistics
+import time
+from types import SimpleNamespace
+
+from .cam import Camera
+from .controller import Controller
+from .recording import read_recording
+
+
+class MockService:
+    """Stand-in for an ONVIF service that records requests instead of sending them."""
+
+    def __init__(self, camera):
+        self._camera = camera
+
+    def create_type(self, name):
+        return SimpleNamespace()
+
+    def __getattr__(self, operation):
+        def send(request):
+            self._camera.commands.append(operation)
+            self._camera.simulated_latency += self._camera.latency
+            return None
+
+        return send
+
+
+class MockCamera(Camera):
+    """
+    A camera that never touches the network.
+
+    Each request is counted in ``commands``; ``latency`` seconds per request
+    are added to ``simulated_latency`` rather than slept. Time, as far as zoom
+    estimation is concerned, is whatever ``now`` is set to.
+    """
+
+    def __init__(self, config, latency=0.0):
+        self.commands = []
+        self.latency = latency
+        self.simulated_latency = 0.0
+        self.now = 0.0
+        super().__init__(dict(config, host="mock"), clock=lambda: self.now)
+
+    def init_camera(self, config):
+        self._ptz = MockService(self)
+        self._imaging = MockService(self)
+        self._token = "mock"
+        self._imaging_token = "mock"
+        self._request = SimpleNamespace(
+            ProfileToken="mock",
+            Velocity=SimpleNamespace(
+                PanTilt=SimpleNamespace(x=0.0, y=0.0), Zoom=SimpleNamespace(x=0.0)
+            ),
+        )
+
+
+class ReplayController(Controller):
+    """Drive a camera from recorded ticks and actions."""
+
+    # event kind -> method that replays it; other kinds are skipped
+    replayers = {"tick": "_replay_tick", "action": "_replay_action"}
+
+    def __init__(self, cam, config, events, log=None):
+        super().__init__(cam, config, log)
+        self.events = events
+        self.step_times = []
+
+    def loop(self):
+        for event in self.events:
+            replayer = self.replayers.get(event["kind"])
+            if replayer is None:
+                continue
+            self.cam.now = event["t"]
+            start = time.perf_counter()
+            getattr(self, replayer)(event)
+            self.step_times.append(time.perf_counter() - start)
+
+    def _replay_tick(self, event):
+        self._move_vector = list(event["vector"])
+        self._focus = event["focus"]
+        self.locked = event["locked"]
+        self._process_move_vector()
+
+    def _replay_action(self, event):
+        self.perform_action(event["cmd"])
+
+
+def _network_replay_class():
+    """Build a replay controller that re-parses recorded MQTT messages."""
+    from .mqtt import NetworkController  # pylint: disable=import-outside-toplevel
+
+    class ReplayNetworkController(ReplayController, NetworkController):
+        replayers = {"mqtt": "_replay_mqtt"}
+
+        def start(self):
+            """Don't connect to a broker."""
+
+        def _replay_mqtt(self, event):
+            msg = SimpleNamespace(
+                topic=event["topic"], payload=event["payload"].encode("utf-8")
+            )
+            self._handle_message(msg)
+
+    return ReplayNetworkController
+
+
+def replay(events, latency=0.0, ticks=False):
+    """
+    Replay events and return ``(controller, camera)`` for inspection.
+
+    With ``ticks``, always replay the recorded ticks and actions rather than
+    the raw inputs.
+    """
+    cam_config = {}
+    controller = None
+    for event in events:
+        if event["kind"] == "start":
+            cam_config = event.get("camera", {})
+            controller = event.get("controller")
+            break
+    camera = MockCamera(cam_config, latency)
+    control_cls = ReplayController
+    if controller == "NetworkController" and not ticks:
+        control_cls = _network_replay_class()
+    control = control_cls(camera, {}, events)
+    control.loop()
+    return control, camera
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a controller recording")
+    parser.add_argument("recording", help="Path to a recording made with --record")
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="Simulated seconds per camera request.",
+    )
+    parser.add_argument(
+        "--ticks",
+        default=False,
+        action="store_true",
+        help="Replay recorded ticks even when raw inputs can be replayed.",
+    )
+    args = parser.parse_args(argv)
+
+    events = read_recording(args.recording)
+    recorded = collections.Counter(
+        event["operation"] for event in events if event["kind"] == "command"
+    )
+    start = time.perf_counter()
+    control, camera = replay(events, args.latency, args.ticks)
+    elapsed = time.perf_counter() - start
+    replayed = collections.Counter(camera.commands)
+    duration = events[-1]["t"] if events else 0.0
+
+    print(f"Replayed {len(control.step_times)} steps ({duration:.1f} s) in {elapsed:.3f} s")
+    print(f"{'operation':<24}{'recorded':>10}{'replayed':>10}")
+    for operation in sorted(set(recorded) | set(replayed)):
+        print(f"{operation:<24}{recorded[operation]:>10}{replayed[operation]:>10}")
+    print(f"{'total':<24}{sum(recorded.values()):>10}{sum(replayed.values()):>10}")
+    if control.step_times:
+        print(
+            "step processing: "
+            f"mean {statistics.mean(control.step_times) * 1e6:.1f} us, "
+            f"p95 {_percentile(control.step_times, 0.95) * 1e6:.1f} us, "
+            f"max {max(control.step_times) * 1e6:.1f} us"
+        )
+    if args.latency:
+        print(f"simulated camera latency: {camera.simulated_latency:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
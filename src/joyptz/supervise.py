@@ -0,0 +1,165 @@
+"""
+Connection supervision.
+
+Cameras reboot, streams drop and brokers go away. A :class:`Supervisor` wraps
+one such connection, reconnecting with exponential backoff behind a circuit
+breaker so that a dead or flapping camera fails fast instead of stalling every
+tick (or killing the process).
+"""
+import logging
+import random
+import threading
+import time
+
+from . import metrics
+
+LOG = logging.getLogger(__name__)
+
+# circuit breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+# returned by Supervisor.call when the call didn't go through, since None is
+# a perfectly good result for many requests
+FAILED = object()
+
+
+class Backoff:
+    """Exponential backoff with jitter."""
+
+    def __init__(self, initial=1.0, maximum=60.0, factor=2.0, jitter=0.1):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+        self.attempts = 0
+
+    def next(self):
+        """Return the next delay in seconds."""
+        delay = min(self.maximum, self.initial * self.factor**self.attempts)
+        self.attempts += 1
+        return delay * random.uniform(1.0 - self.jitter, 1.0 + self.jitter)
+
+    def reset(self):
+        self.attempts = 0
+
+
+class CircuitBreaker:
+    """
+    Stop calling something that keeps failing.
+
+    After ``threshold`` consecutive failures the breaker opens and rejects
+    calls until the backoff delay passes. It then lets one trial call through
+    (half-open); success closes it, failure re-opens it with a longer delay.
+    """
+
+    def __init__(self, threshold=3, backoff=None):
+        self.threshold = threshold
+        self.backoff = backoff or Backoff()
+        self.state = CLOSED
+        self.failures = 0
+        self._retry_at = 0.0
+
+    def allow(self):
+        """Return True if a call may go through now."""
+        if self.state == OPEN:
+            if time.monotonic() < self._retry_at:
+                return False
+            self.state = HALF_OPEN
+        return True
+
+    def retry_in(self):
+        """Seconds until the breaker will allow another call."""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self._retry_at - time.monotonic())
+
+    def success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.backoff.reset()
+
+    def failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.threshold:
+            self.state = OPEN
+            self._retry_at = time.monotonic() + self.backoff.next()
+
+
+class Supervisor:
+    """
+    Keep a connection alive.
+
+    ``connect`` is called to (re)establish the connection and should raise one
+    of ``errors`` on failure. Errors for which ``is_fault`` returns True came
+    back from the remote end, which proves the connection is fine, so they are
+    re-raised to the caller instead of counting against the breaker.
+    """
+
+    def __init__(self, name, connect, errors=(Exception,), is_fault=None, breaker=None):
+        self.name = name
+        self.errors = errors
+        self.breaker = breaker or CircuitBreaker()
+        self.connected = False
+        self._connect = connect
+        self._is_fault = is_fault or (lambda err: False)
+        self._lock = threading.Lock()
+        metrics.CONNECTION_UP.set(0, name=name)
+
+    def ensure(self):
+        """Connect if needed and allowed. Return True if connected."""
+        if self.connected:
+            return True
+        with self._lock:
+            if self.connected:
+                return True
+            if not self.breaker.allow():
+                return False
+            LOG.info("Connecting to %s", self.name)
+            metrics.RECONNECTS.inc(name=self.name)
+            try:
+                self._connect()
+            except self.errors as err:
+                self.failed(err)
+                return False
+            self.connected = True
+            metrics.CONNECTION_UP.set(1, name=self.name)
+            self.breaker.success()
+            LOG.info("Connected to %s", self.name)
+        return True
+
+    def wait(self):
+        """Block until connected, sleeping through the backoff."""
+        while not self.ensure():
+            time.sleep(self.breaker.retry_in())
+
+    def call(self, func, *args, **kwargs):
+        """Call ``func`` over the connection, returning FAILED if it's down."""
+        if not self.ensure():
+            return FAILED
+        try:
+            result = func(*args, **kwargs)
+        except self.errors as err:
+            if self._is_fault(err):
+                raise
+            self.failed(err)
+            return FAILED
+        if self.breaker.failures:
+            self.breaker.success()
+        return result
+
+    def failed(self, err):
+        """Record a failure, dropping the connection once the breaker opens."""
+        self.breaker.failure()
+        if self.breaker.state == OPEN:
+            self.connected = False
+            metrics.CONNECTION_UP.set(0, name=self.name)
+            LOG.warning(
+                "%s is down (%s); retrying in %.1f s",
+                self.name,
+                err,
+                self.breaker.retry_in(),
+            )
+        else:
+            LOG.warning("%s error: %s", self.name, err)
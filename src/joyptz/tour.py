@@ -0,0 +1,200 @@
+"""
+Preset tours.
+
+Cycle cameras through their presets on a schedule. Every tour shares one
+scheduler thread that keeps a heap of due times, so running hundreds of
+tours doesn't mean hundreds of threads or sleep loops. The preset requests
+themselves go to a small worker pool, one at a time per camera, so a slow
+camera only delays its own tours.
+"""
+import collections
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .cam import Camera
+from .controller import Controller
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_DWELL_S = 10.0
+DEFAULT_WORKERS = 4
+
+
+class PresetTour:
+    """A camera cycling through a precomputed sequence of presets."""
+
+    def __init__(self, name, camera, presets=None, dwell=DEFAULT_DWELL_S, jitter=0.0):
+        self.name = name
+        self.camera = camera
+        self.dwell = float(dwell)
+        self.jitter = float(jitter)
+        self._presets = presets
+        # resolved on the first step, so a camera that is down at startup
+        # still gets its tour once it comes back
+        self.sequence = []
+        self._index = 0
+
+    def _build_sequence(self):
+        """
+        Resolve the configured presets into ``(token, dwell)`` steps.
+
+        Entries are either a preset token or a ``[token, dwell]`` pair. With no
+        presets given, every preset on the camera is visited.
+        """
+        available = self.camera.get_presets()
+        presets = available if self._presets is None else self._presets
+        sequence = []
+        for entry in presets:
+            if isinstance(entry, (list, tuple)):
+                token, step_dwell = str(entry[0]), float(entry[1])
+            else:
+                token, step_dwell = str(entry), self.dwell
+            if available and token not in available:
+                LOG.warning("Tour %s: skipping unknown preset %s", self.name, token)
+                continue
+            sequence.append((token, step_dwell))
+        return sequence
+
+    def step(self):
+        """Go to the next preset and return seconds to dwell there."""
+        if not self.sequence:
+            self.sequence = self._build_sequence()
+            if not self.sequence:
+                LOG.warning(
+                    "Tour %s has no presets yet; retrying in %.0f s",
+                    self.name,
+                    self.dwell,
+                )
+                return self.dwell
+        token, dwell = self.sequence[self._index]
+        self._index = (self._index + 1) % len(self.sequence)
+        self.camera.goto_preset(token)
+        return max(0.0, dwell + random.uniform(-self.jitter, self.jitter))
+
+
+class TourScheduler:
+    """Run many tours from a single scheduling thread."""
+
+    def __init__(self, workers=DEFAULT_WORKERS):
+        self._heap = []
+        self._order = itertools.count()  # tie-breaker for equal due times
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+        self._workers = workers
+        self._pool = None
+        # cameras with a request in flight, and tours waiting on them
+        self._busy = set()
+        self._waiting = collections.defaultdict(collections.deque)
+        self._removed = set()
+
+    def add(self, tour, delay=0.0):
+        """Schedule a tour to take its next step after ``delay`` seconds."""
+        with self._cond:
+            self._removed.discard(tour.name)
+        self._schedule(tour, delay)
+
+    def _schedule(self, tour, delay):
+        with self._cond:
+            if tour.name in self._removed:
+                return
+            heapq.heappush(
+                self._heap, (time.monotonic() + delay, next(self._order), tour)
+            )
+            self._cond.notify()
+
+    def remove(self, name):
+        """Drop a tour by name."""
+        with self._cond:
+            self._removed.add(name)
+            self._heap = [item for item in self._heap if item[2].name != name]
+            heapq.heapify(self._heap)
+
+    def start(self):
+        """Start the scheduler thread and worker pool."""
+        self._running = True
+        self._pool = ThreadPoolExecutor(self._workers, thread_name_prefix="tour")
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the scheduler thread."""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+
+    def run(self):
+        """Step each tour as it comes due."""
+        while True:
+            with self._cond:
+                while self._running:
+                    now = time.monotonic()
+                    if self._heap and self._heap[0][0] <= now:
+                        break
+                    timeout = self._heap[0][0] - now if self._heap else None
+                    self._cond.wait(timeout)
+                if not self._running:
+                    return
+                _due, _order, tour = heapq.heappop(self._heap)
+                camera = id(tour.camera)
+                if camera in self._busy:
+                    self._waiting[camera].append(tour)
+                    continue
+                self._busy.add(camera)
+            self._pool.submit(self._step, tour)
+
+    def _step(self, tour):
+        """Step a tour, then any others that queued up for the same camera."""
+        camera = id(tour.camera)
+        while tour is not None:
+            try:
+                dwell = tour.step()
+            except Exception:  # pylint: disable=broad-except
+                # one misbehaving camera shouldn't end every other tour
+                LOG.exception("Tour %s failed to step", tour.name)
+                dwell = tour.dwell
+            self._schedule(tour, dwell)
+            with self._cond:
+                waiting = self._waiting[camera]
+                tour = waiting.popleft() if waiting else None
+                if tour is None:
+                    self._busy.discard(camera)
+
+
+class TourController(Controller):
+    """Run the preset tours defined under ``tours`` in the config."""
+
+    def __init__(self, cam, config, log=None):
+        super().__init__(cam, config, log)
+        self.scheduler = TourScheduler(int(config.get("tour_workers", DEFAULT_WORKERS)))
+        cameras = {config.get("camname"): cam}
+        for name, tour_conf in config.get("tours", {}).items():
+            camname = tour_conf.get("camera", config.get("camname"))
+            if camname not in cameras:
+                cameras[camname] = Camera(config[camname])
+            tour = PresetTour(
+                name,
+                cameras[camname],
+                tour_conf.get("presets"),
+                tour_conf.get("dwell", DEFAULT_DWELL_S),
+                tour_conf.get("jitter", 0.0),
+            )
+            self.scheduler.add(tour, tour_conf.get("delay", 0.0))
+
+    def loop(self):
+        self.scheduler.start()
+        while True:
+            self._run_soon(0.5)
+
+    def stop(self):
+        """Stop all tours."""
+        self.scheduler.stop()
@@ -4,16 +4,18 @@ import math
 
 import cv2
 
+from . import metrics, supervise
 from .controller import Controller
 
 (major_ver, minor_ver, subminor_ver) = (cv2.__version__).split(".")
 
 
-def select_new_roi(frame):
+def select_new_roi(frame, bbox=None):
     """
     Build a new tracker and select a new ROI.
 
-    Used for init and to re-select a new ROI when one is lost.
+    Used for init and to re-select a new ROI when one is lost. The user picks
+    the ROI on screen unless a ``bbox`` is given.
     """
     tracker_types = [
         "BOOSTING",
@@ -43,8 +45,9 @@ def select_new_roi(frame):
             "MOSSE": cv2.legacy.TrackerMOSSE_create,
             "CSRT": cv2.legacy.TrackerCSRT_create,
         }[tracker_type]()
-    bbox = cv2.selectROI(frame, False)
-    ok = tracker.init(frame, bbox)
+    if bbox is None:
+        bbox = cv2.selectROI(frame, False)
+    ok = tracker.init(frame, tuple(bbox))
 
     return tracker
 
@@ -66,25 +69,40 @@ class TrackedController(Controller):
         super().__init__(cam, config, log)
         self._speed = INITIAL_SPEED
         self._last_mag = INITIAL_MAG
+        # set display to False to run without a window (no ROI selection)
+        self._display = config.get("display", True)
 
         # webcam
         # video = cv2.VideoCapture(0)
-        video = self._video = cv2.VideoCapture(config["cam"]["stream"])
-
-        # Exit if video not opened.
-        if not video.isOpened():
-            print("Could not open video")
-            sys.exit()
+        self._video = None
+        # files and local devices just end; only network streams get reopened
+        self._network = "://" in str(config["cam"]["stream"])
+        backoff = supervise.Backoff(
+            float(config["cam"].get("reconnect_min", 1.0)),
+            float(config["cam"].get("reconnect_max", 60.0)),
+        )
+        self._stream = supervise.Supervisor(
+            f"{config.get('camname', 'camera')} stream",
+            lambda: self._open_stream(config["cam"]["stream"]),
+            errors=(IOError,),
+            breaker=supervise.CircuitBreaker(1, backoff),
+        )
 
         # Read first frame.
-        ok, frame = video.read()
-        if not ok:
+        frame = self._read_frame()
+        if frame is None:
             print("Cannot read video file")
             sys.exit()
 
         # Define an initial bounding box
         bbox = (287, 23, 86, 320)
-        self._tracker = select_new_roi(frame)
+        # with start_idle, wait for a "track" action (e.g. from a motion event)
+        # instead of running the tracker on an empty scene
+        self._idle = config["cam"].get("start_idle", False)
+        self._pending_roi = None
+        self._tracker = None
+        if not self._idle:
+            self._tracker = select_new_roi(frame, config["cam"].get("roi"))
 
         height, width, channels = frame.shape
         self._center = (width // 2, height // 2)
@@ -95,19 +113,107 @@ class TrackedController(Controller):
         else:
             self._out = None
 
+    def _open_stream(self, url):
+        """Open the video stream, raising IOError if it can't be opened."""
+        if self._video is not None:
+            self._video.release()
+        self._video = cv2.VideoCapture(url)
+        if not self._video.isOpened():
+            raise IOError("Could not open video")
+
+    def perform_action(self, cmd):
+        """
+        Handle ``track [x y w h]`` and ``idle`` on top of the usual actions.
+
+        They only set flags for the tracking loop to act on at the next frame.
+        """
+        words = cmd.split()
+        if words and words[0] == "track":
+            if len(words) not in (1, 5):
+                self.log.info(f"Need x y w h to track a region: {cmd}")
+                return
+            self._record("action", cmd=cmd)
+            roi = [int(float(v)) for v in words[1:]] or self.config["cam"].get("roi")
+            if not roi and not self._display:
+                self.log.info("Can't select an ROI without a display")
+                return
+            self._pending_roi = roi or "select"
+            self._idle = False
+        elif cmd == "idle":
+            self._record("action", cmd=cmd)
+            self._idle = True
+        else:
+            super().perform_action(cmd)
+
+    def _show(self, frame):
+        """Display a frame and return the key pressed, if displaying."""
+        if not self._display:
+            return None
+        cv2.imshow("Tracking", frame)
+        return cv2.waitKey(1) & 0xFF
+
+    def _on_frame(self, frame):
+        """Hook called with every frame read, even while idle."""
+
+    def _on_track(self, ok, bbox, frame):
+        """Hook called with the result of each tracker update."""
+
+    def _read_frame(self):
+        """
+        Read the next frame, reopening a network stream if it drops.
+
+        Returns None at the end of a file or local device.
+        """
+        while True:
+            if self._network:
+                self._stream.wait()
+            elif not self._stream.ensure():
+                return None
+            ok, frame = self._video.read()
+            if ok:
+                return frame
+            if not self._network:
+                return None
+            self._stream.failed(IOError("Cannot read video"))
+            # don't keep steering blind while the stream is down
+            self._move_vector = [0, 0, 0]
+            self._process_move_vector()
+
     def loop(self):
         move_timer = cv2.getTickCount()
         mag = INITIAL_MAG
         closeness = 1.0
         while True:
             # Read a new frame
-            ok, frame = self._video.read()
-            if not ok:
+            frame = self._read_frame()
+            if frame is None:
                 break
+            self._mark_input()
+            self._on_frame(frame)
+            self._run_soon()
+
+            if self._pending_roi is not None:
+                roi, self._pending_roi = self._pending_roi, None
+                self._tracker = select_new_roi(frame, None if roi == "select" else roi)
+                self._speed = INITIAL_SPEED
+            if self._idle or self._tracker is None:
+                # nothing to follow; skip the tracker and hold still
+                if any(self._move_vector):
+                    self._move_vector = [0, 0, 0]
+                    self._process_move_vector()
+                k = self._show(frame)
+                if k == 27:
+                    break
+                elif k == ord("r"):
+                    self.perform_action("track")
+                continue
 
             tracker_timer = cv2.getTickCount()
 
-            ok, bbox = self._tracker.update(frame)
+            with metrics.TRACKER_LATENCY.time():
+                ok, bbox = self._tracker.update(frame)
+            self._record("bbox", ok=bool(ok), bbox=[float(v) for v in bbox])
+            self._on_track(ok, bbox, frame)
 
             tracker_timer2 = cv2.getTickCount()
             tick_freq = cv2.getTickFrequency()
@@ -149,7 +255,8 @@ class TrackedController(Controller):
                     self._move_vector = [0, 0, 0]
                     self._speed = INITIAL_SPEED
                     self._process_move_vector()
-                    self.log.info("STOP")
+                    if self.verbose:
+                        self.log.info("STOP")
                 else:
                     # don't always make a unit vector. Keep it slow if the arrow is small
                     # relative to the screen size.
@@ -194,12 +301,11 @@ class TrackedController(Controller):
             )
 
             # Display result
-            cv2.imshow("Tracking", frame)
             if self._out is not None:
                 self._out.write(frame)
 
             # Exit if ESC pressed
-            k = cv2.waitKey(1) & 0xFF
+            k = self._show(frame)
             if k == 27:
                 break
             elif k == ord("r"):
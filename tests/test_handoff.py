@@ -0,0 +1,91 @@
+"""Handoff decisions, driven without worker processes."""
+import pytest
+
+pytest.importorskip("cv2")
+pytest.importorskip("onvif")
+
+from joyptz import handoff  # pylint: disable=wrong-import-position
+
+SIZE = (1000, 500)
+
+# the README example, without an roi so entry boxes are mirrored
+CONFIG = {
+    "camname": "cam1",
+    "cam1": {"roi": [450, 200, 60, 60]},
+    "cam2": {},
+    "handoff": {
+        "cameras": ["cam1", "cam2"],
+        "start": "cam1",
+        "neighbors": {
+            "cam1": {"right": {"camera": "cam2", "preset": 2}},
+            "cam2": {"left": {"camera": "cam1", "move": [0.9, 0.1, 0.2]}},
+        },
+    },
+}
+
+
+class Coordinator(handoff.HandoffCoordinator):
+    """A coordinator that records commands instead of running pipelines."""
+
+    def __init__(self, config):
+        self.sent = []
+        super().__init__(None, config)
+        self.sent.clear()
+
+    def _start_worker(self, camname):
+        pass
+
+    def send(self, camname, cmd):
+        self.sent.append((camname, cmd))
+
+
+def hand_over():
+    coordinator = Coordinator(CONFIG)
+    coordinator.update(True, [880, 200, 60, 60], SIZE)
+    coordinator.update(True, [950, 200, 60, 60], SIZE)
+    assert coordinator.sent == [
+        ("cam2", "preset 2"),
+        ("cam1", "idle"),
+        ("cam2", "track 50 200 60 60"),
+    ]
+    assert coordinator.active == "cam2"
+    coordinator.sent.clear()
+    return coordinator
+
+
+def test_hands_over_at_the_edge():
+    hand_over()
+
+
+def test_does_not_hand_straight_back():
+    coordinator = hand_over()
+    coordinator.update(True, [50, 200, 60, 60], SIZE)
+    coordinator.update(True, [0, 200, 60, 60], SIZE)
+    coordinator.update(False, [0, 200, 60, 60], SIZE)
+    assert coordinator.sent == []
+    assert coordinator.active == "cam2"
+
+
+def test_entry_edge_rearms_once_cleared():
+    coordinator = hand_over()
+    coordinator.update(True, [450, 200, 60, 60], SIZE)
+    coordinator.update(True, [50, 200, 60, 60], SIZE)
+    assert coordinator.sent == [("cam1", "move 0.9 0.1 0.2")]
+
+
+def test_entry_edge_rearms_after_grace():
+    coordinator = hand_over()
+    coordinator._entered_at -= coordinator.grace_s + 1
+    coordinator.update(True, [50, 200, 60, 60], SIZE)
+    assert coordinator.sent == [("cam1", "move 0.9 0.1 0.2")]
+
+
+def test_entry_roi_is_inside_the_frame():
+    assert handoff.entry_roi([950, 200, 60, 60], SIZE, "right") == [50, 200, 60, 60]
+    assert handoff.entry_roi([0, 200, 60, 60], SIZE, "left") == [890, 200, 60, 60]
+
+
+def test_rejects_unknown_neighbor():
+    config = dict(CONFIG, handoff=dict(CONFIG["handoff"], cameras=["cam1"]))
+    with pytest.raises(ValueError):
+        Coordinator(config)